@@ -12,11 +12,22 @@ Usage:
     python search_iwc_workflows.py --limit 10
 """
 
+import os
+import re
 import sys
 import json
+import time
 import argparse
-from urllib import request, error
-from typing import Dict, List, Optional
+import gzip
+import io
+import tempfile
+import itertools
+import http.client
+from urllib import parse, error
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Insignificant whitespace between JSON tokens
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
 
 
 class IWCWorkflowSearcher:
@@ -24,6 +35,9 @@ class IWCWorkflowSearcher:
     
     MANIFEST_URL = "https://iwc.galaxyproject.org/workflow_manifest.json"
     
+    # How long a cached manifest is used before revalidating it (seconds)
+    CACHE_TTL = 24 * 60 * 60
+    
     # Category mappings
     CATEGORIES = [
         "Variant Calling",
@@ -36,29 +50,195 @@ class IWCWorkflowSearcher:
         "Proteomics",
     ]
     
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None, refresh: bool = False):
+        """
+        Args:
+            cache_dir: Directory for the on-disk manifest cache
+                (default: $XDG_CACHE_HOME/iwc or ~/.cache/iwc)
+            refresh: Ignore any cached manifest and download it again
+        """
         self.session_headers = {
             'User-Agent': 'Claude-IWCWorkflowSearcher/1.0',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip'
         }
         self._manifest_cache = None
+        self._workflow_cache: Optional[List[Dict]] = None
+        self._lowered_names: Dict[str, str] = {}
+        # Lowercased category -> indices into _workflow_cache
+        self._category_index: Dict[str, List[int]] = {}
+        if cache_dir is None:
+            cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            cache_dir = os.path.join(cache_root, 'iwc')
+        self.cache_path = os.path.join(cache_dir, 'manifest.json')
+        self.refresh = refresh
+        # Idle keep-alive connections, keyed by (scheme, host)
+        self._connections: Dict[tuple, List[http.client.HTTPConnection]] = {}
+
+    def _get(self, url: str, timeout: int, headers: Optional[Dict[str, str]] = None) -> Tuple[int, object, bytes]:
+        """
+        Fetch a URL over a pooled keep-alive connection.
+
+        Raises the same urllib errors as urlopen (HTTPError for error
+        statuses, URLError for connection failures) so callers can keep
+        their existing error handling.
+
+        Args:
+            url: Absolute URL to fetch
+            timeout: Socket timeout in seconds
+            headers: Extra request headers (e.g. conditional request headers)
+
+        Returns:
+            Tuple of (status, response headers, raw response body)
+        """
+        request_headers = {**self.session_headers, **headers} if headers else self.session_headers
+        for _ in range(5):
+            status, reason, response_headers, body = self._send(url, timeout, request_headers)
+            if status in (301, 302, 303, 307, 308) and response_headers.get('Location'):
+                url = parse.urljoin(url, response_headers['Location'])
+                continue
+            if status >= 400:
+                raise error.HTTPError(url, status, reason, response_headers, None)
+            return status, response_headers, body
+        raise error.URLError('Too many redirects')
+
+    def _send(self, url: str, timeout: int, headers: Dict[str, str]) -> tuple:
+        """Send a single GET request, retrying once if a reused connection went stale."""
+        parts = parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+        for attempt in range(2):
+            idle = self._connections.get(key)
+            reused = bool(idle)
+            if reused:
+                conn = idle.pop()
+            elif parts.scheme == 'https':
+                conn = http.client.HTTPSConnection(parts.netloc, timeout=timeout)
+            else:
+                conn = http.client.HTTPConnection(parts.netloc, timeout=timeout)
+
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                if response.getheader('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                # The server may have dropped an idle keep-alive connection
+                if reused and attempt == 0:
+                    continue
+                raise error.URLError(e)
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._connections.setdefault(key, []).append(conn)
+            return response.status, response.reason, response.headers, body
+
+    def close(self):
+        """Close any idle keep-alive connections."""
+        for idle in self._connections.values():
+            for conn in idle:
+                conn.close()
+        self._connections.clear()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
     
-    def _fetch_manifest(self) -> List[Dict]:
+    def _read_cache(self) -> Optional[Tuple[bytes, float, Dict]]:
+        """
+        Read the cached manifest from disk.
+        
+        Returns:
+            Tuple of (raw manifest, modification time, validator headers),
+            or None if there is no usable cache
+        """
+        try:
+            with open(self.cache_path, 'rb') as f:
+                raw = f.read()
+            mtime = os.path.getmtime(self.cache_path)
+        except OSError:
+            return None
+        
+        # ETag / Last-Modified from the response that produced the cache
+        try:
+            with open(self.cache_path + '.meta', 'r', encoding='utf-8') as f:
+                validators = json.load(f)
+        except (OSError, ValueError):
+            validators = {}
+        
+        return raw, mtime, validators
+    
+    def _write_cache(self, raw: bytes, validators: Dict):
+        """
+        Atomically store the manifest and its validators on disk.
+        
+        Caching is best-effort: an unwritable cache directory is ignored.
+        """
+        cache_dir = os.path.dirname(self.cache_path)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            for path, content in ((self.cache_path, raw),
+                                  (self.cache_path + '.meta', json.dumps(validators).encode('utf-8'))):
+                with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as tmp:
+                    tmp.write(content)
+                os.replace(tmp.name, path)
+        except OSError:
+            pass
+    
+    def _fetch_manifest(self) -> str:
         """
         Fetch the IWC workflow manifest.
         
+        A copy is cached on disk and reused for CACHE_TTL seconds. After
+        that it is revalidated with a conditional request, so an unchanged
+        manifest is not downloaded again.
+        
         Returns:
-            List of workflow repositories with their workflows
+            Manifest JSON text (a list of workflow repositories)
         """
         if self._manifest_cache is not None:
             return self._manifest_cache
         
+        cached = None if self.refresh else self._read_cache()
+        if cached is not None:
+            raw, mtime, validators = cached
+            if time.time() - mtime < self.CACHE_TTL:
+                try:
+                    self._manifest_cache = self._decode_manifest(raw)
+                    return self._manifest_cache
+                except ValueError:
+                    cached = None
+        
+        conditional_headers = {}
+        if cached is not None:
+            if validators.get('etag'):
+                conditional_headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                conditional_headers['If-Modified-Since'] = validators['last_modified']
+        
         try:
-            req = request.Request(self.MANIFEST_URL, headers=self.session_headers)
-            with request.urlopen(req, timeout=30) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                self._manifest_cache = data
-                return data
+            status, headers, raw = self._get(self.MANIFEST_URL, timeout=30, headers=conditional_headers)
+            if status == 304 and cached is not None:
+                # Unchanged upstream: reuse the cached copy and restart its TTL
+                raw = cached[0]
+                try:
+                    os.utime(self.cache_path)
+                except OSError:
+                    pass
+            text = self._decode_manifest(raw)
+            if status != 304:
+                self._write_cache(raw, {
+                    'etag': headers.get('ETag'),
+                    'last_modified': headers.get('Last-Modified')
+                })
+            self._manifest_cache = text
+            return text
         except error.HTTPError as e:
             raise Exception(f'HTTP error {e.code}: {e.reason}')
         except error.URLError as e:
@@ -66,17 +246,66 @@ class IWCWorkflowSearcher:
         except Exception as e:
             raise Exception(f'Unexpected error fetching manifest: {str(e)}')
     
-    def _extract_workflows(self, manifest: List[Dict]) -> List[Dict]:
+    def _decode_manifest(self, raw: bytes) -> str:
+        """
+        Decode raw manifest bytes, checking that they hold a JSON array.
+        
+        Raises:
+            ValueError: If the data is not a JSON array
+        """
+        text = raw.decode('utf-8')
+        stripped = text.strip()
+        if not (stripped.startswith('[') and stripped.endswith(']')):
+            raise ValueError('Workflow manifest is not a JSON array')
+        return text
+    
+    def _iter_manifest(self) -> Iterator[Dict]:
+        """
+        Iterate over the repositories in the manifest one at a time.
+        
+        The manifest is a top-level JSON array. Decoding it element by
+        element means only the repository currently being processed is
+        held as parsed objects, never the whole manifest tree.
+        
+        Yields:
+            Workflow repository dictionaries
         """
-        Extract all workflows from the manifest.
+        text = self._fetch_manifest()
+        decoder = json.JSONDecoder()
+        
+        pos = _WHITESPACE.match(text, text.index('[') + 1).end()
+        if text.startswith(']', pos):
+            return
+        
+        while True:
+            repo, pos = decoder.raw_decode(text, pos)
+            yield repo
+            pos = _WHITESPACE.match(text, pos).end()
+            if text.startswith(',', pos):
+                pos = _WHITESPACE.match(text, pos + 1).end()
+            elif text.startswith(']', pos):
+                return
+            else:
+                raise ValueError(f'Malformed workflow manifest at character {pos}')
+    
+    def _extract_workflows(self, manifest: Iterator[Dict], category: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Extract workflows from the manifest, lazily.
         
         Args:
-            manifest: Raw manifest data
+            manifest: Iterable of manifest repositories
+            category: Only yield workflows in a matching category (optional).
+                Checked before a workflow's dictionary is built.
             
-        Returns:
-            List of workflow dictionaries with metadata
+        Yields:
+            Workflow dictionaries with metadata
         """
-        workflows = []
+        category_lower = category.lower() if category else None
+        lower = self._lower_name
+        
+        # Category and tag names repeat across many workflows; interning
+        # them shares one string object per distinct name
+        intern = sys.intern
         
         for repo in manifest:
             for workflow in repo.get('workflows', []):
@@ -84,40 +313,79 @@ class IWCWorkflowSearcher:
                 if 'tests' not in workflow:
                     continue
                 
+                if category_lower and not any(category_lower in lower(cat) for cat in workflow.get('collections', [])):
+                    continue
+                
                 definition = workflow.get('definition', {})
                 
-                workflows.append({
+                yield {
                     'name': definition.get('name', 'Unknown'),
                     'description': definition.get('annotation', ''),
                     'trs_id': workflow.get('trsID', ''),
                     'iwc_id': workflow.get('iwcID', ''),
                     'release': definition.get('release', ''),
-                    'categories': workflow.get('collections', []),
+                    'categories': [intern(c) for c in workflow.get('collections', [])],
                     'license': definition.get('license', ''),
                     'creators': definition.get('creator', []),
-                    'tags': definition.get('tags', []),
-                })
+                    'tags': [intern(t) if isinstance(t, str) else t for t in definition.get('tags', [])],
+                }
+    
+    def _lower_name(self, name: str) -> str:
+        """Lowercase a category name, computing each distinct name only once."""
+        lowered = self._lowered_names.get(name)
+        if lowered is None:
+            lowered = self._lowered_names[name] = name.lower()
+        return lowered
+    
+    def _get_workflows(self) -> List[Dict]:
+        """
+        Get all workflows, extracting them and indexing their categories once.
         
-        return workflows
+        Returns:
+            List of workflow dictionaries with metadata
+        """
+        if self._workflow_cache is None:
+            workflows = list(self._extract_workflows(self._iter_manifest()))
+            
+            # Workflow positions per lowercased category, so the output
+            # dictionaries stay unchanged
+            lower = self._lower_name
+            index: Dict[str, List[int]] = {}
+            for i, workflow in enumerate(workflows):
+                for cat in workflow['categories']:
+                    ids = index.setdefault(lower(cat), [])
+                    if not ids or ids[-1] != i:
+                        ids.append(i)
+            
+            self._category_index = index
+            self._workflow_cache = workflows
+        
+        return self._workflow_cache
     
-    def _filter_by_category(self, workflows: List[Dict], category: str) -> List[Dict]:
+    def _filter_by_category(self, category: str) -> List[Dict]:
         """
         Filter workflows by category.
         
+        Matches any category containing the given text (case-insensitive),
+        using the category index rather than scanning every workflow.
+        
         Args:
-            workflows: List of workflow dictionaries
             category: Category to filter by
             
         Returns:
-            Filtered list of workflows
+            Filtered list of workflows, in manifest order
         """
+        workflows = self._get_workflows()
         if not category:
             return workflows
         
-        return [
-            w for w in workflows 
-            if any(category.lower() in cat.lower() for cat in w.get('categories', []))
-        ]
+        category_lower = category.lower()
+        matches = set()
+        for key, ids in self._category_index.items():
+            if category_lower in key:
+                matches.update(ids)
+        
+        return [workflows[i] for i in sorted(matches)]
     
     
     def search(
@@ -136,16 +404,21 @@ class IWCWorkflowSearcher:
             Dictionary with search results
         """
         try:
-            manifest = self._fetch_manifest()
-            workflows = self._extract_workflows(manifest)
-            
-            # Apply category filter if specified
-            if category:
-                workflows = self._filter_by_category(workflows, category)
-            
-            # Apply limit if specified
-            if limit is not None:
-                workflows = workflows[:limit]
+            if limit is not None and limit >= 0 and self._workflow_cache is None:
+                # Only the first few matches are needed: stop walking the
+                # manifest as soon as enough have been found
+                matches = self._extract_workflows(self._iter_manifest(), category)
+                workflows = list(itertools.islice(matches, limit))
+            else:
+                workflows = self._get_workflows()
+                
+                # Apply category filter if specified
+                if category:
+                    workflows = self._filter_by_category(category)
+                
+                # Apply limit if specified
+                if limit is not None:
+                    workflows = workflows[:limit]
             
             return {
                 'success': True,
@@ -169,13 +442,23 @@ class IWCWorkflowSearcher:
             Dictionary with category information
         """
         try:
-            manifest = self._fetch_manifest()
-            workflows = self._extract_workflows(manifest)
-            
             # Collect all unique categories
-            categories = set()
-            for workflow in workflows:
-                categories.update(workflow.get('categories', []))
+            if self._workflow_cache is not None:
+                categories = {
+                    cat
+                    for workflow in self._workflow_cache
+                    for cat in workflow['categories']
+                }
+            else:
+                # Read categories straight from the manifest rather than
+                # building every workflow dictionary just to discard it
+                categories = {
+                    cat
+                    for repo in self._iter_manifest()
+                    for workflow in repo.get('workflows', [])
+                    if 'tests' in workflow
+                    for cat in workflow.get('collections', [])
+                }
             
             return {
                 'success': True,
@@ -190,19 +473,40 @@ class IWCWorkflowSearcher:
             }
 
 
-def format_output(data: Dict, format_type: str = 'human') -> str:
+def _dump_json(data: Dict, compact: bool) -> str:
+    """Serialize data as indented JSON, or compact JSON when compact is set."""
+    if compact:
+        return json.dumps(data, separators=(',', ':'))
+    return json.dumps(data, indent=2)
+
+
+# Fixed pieces of the human-readable workflow listing
+_SEPARATOR = "-" * 60 + "\n"
+_WORKFLOWS_BANNER = "\n" + "=" * 60 + "\nWORKFLOWS\n" + "=" * 60 + "\n"
+_WORKFLOW_HEADER = "\nWorkflow {i}:\n  Name: {name}\n"
+
+
+def _truncate(text: str, width: int) -> str:
+    """Cut text to width characters, ending in '...' when shortened."""
+    if len(text) > width:
+        return text[:width - 3] + '...'
+    return text
+
+
+def format_output(data: Dict, format_type: str = 'human', compact: bool = False) -> str:
     """
     Format the search results for output.
     
     Args:
         data: Search results dictionary
         format_type: 'json' or 'human'
+        compact: Emit JSON without indentation (for piping to other programs)
         
     Returns:
         Formatted string
     """
     if format_type == 'json':
-        return json.dumps(data, indent=2)
+        return _dump_json(data, compact)
     
     if not data.get('success'):
         error_msg = data.get('error', 'Unknown error')
@@ -219,43 +523,45 @@ def format_output(data: Dict, format_type: str = 'human') -> str:
         return '\n'.join(output)
     
     # Human-readable format for workflow search
-    output = []
+    buf = io.StringIO()
+    write = buf.write
     if data.get('category'):
-        output.append(f"Category Filter: {data['category']}")
-    output.append(f"Workflows Found: {data.get('count', 0)}")
+        write(f"Category Filter: {data['category']}\n")
+    write(f"Workflows Found: {data.get('count', 0)}\n")
     
     if data.get('workflows'):
-        output.append("\n" + "="*60)
-        output.append("WORKFLOWS")
-        output.append("="*60)
+        write(_WORKFLOWS_BANNER)
         
         for i, workflow in enumerate(data['workflows'], 1):
-            output.append(f"\nWorkflow {i}:")
-            output.append(f"  Name: {workflow.get('name', 'N/A')}")
+            get = workflow.get
+            write(_WORKFLOW_HEADER.format(i=i, name=get('name', 'N/A')))
             
-            if workflow.get('description'):
-                desc = workflow['description']
-                if len(desc) > 150:
-                    desc = desc[:147] + '...'
-                output.append(f"  Description: {desc}")
+            desc = get('description')
+            if desc:
+                write(f"  Description: {_truncate(desc, 150)}\n")
             
-            if workflow.get('categories'):
-                output.append(f"  Categories: {', '.join(workflow['categories'])}")
+            categories = get('categories')
+            if categories:
+                write(f"  Categories: {', '.join(categories)}\n")
             
-            output.append(f"  TRS ID: {workflow.get('trs_id', 'N/A')}")
+            write(f"  TRS ID: {get('trs_id', 'N/A')}\n")
             
-            if workflow.get('iwc_id'):
-                output.append(f"  IWC ID: {workflow['iwc_id']}")
+            iwc_id = get('iwc_id')
+            if iwc_id:
+                write(f"  IWC ID: {iwc_id}\n")
             
-            if workflow.get('release'):
-                output.append(f"  Release: v{workflow['release']}")
+            release = get('release')
+            if release:
+                write(f"  Release: v{release}\n")
             
-            if workflow.get('tags'):
-                output.append(f"  Tags: {', '.join(workflow['tags'][:5])}")
+            tags = get('tags')
+            if tags:
+                write(f"  Tags: {', '.join(tags[:5])}\n")
             
-            output.append("-"*60)
+            write(_SEPARATOR)
     
-    return '\n'.join(output)
+    # Drop the final newline so the result matches the other branches
+    return buf.getvalue()[:-1]
 
 
 def main():
@@ -278,24 +584,26 @@ Examples:
                        help='Output format (default: json)')
     parser.add_argument('--list-categories', action='store_true',
                        help='List all available workflow categories')
+    parser.add_argument('--refresh', action='store_true',
+                       help='Ignore the cached workflow manifest and download it again')
     
     args = parser.parse_args()
     
-    searcher = IWCWorkflowSearcher()
+    # Pretty-print JSON for people; emit compact JSON when piped
+    compact = not sys.stdout.isatty()
     
-    # Handle category listing
-    if args.list_categories:
-        result = searcher.list_categories()
-        print(format_output(result, args.format))
-        sys.exit(0 if result.get('success') else 1)
-    
-    # Fetch workflows (optionally filtered by category)
-    result = searcher.search(
-        category=args.category,
-        limit=args.limit
-    )
+    with IWCWorkflowSearcher(refresh=args.refresh) as searcher:
+        if args.list_categories:
+            # Handle category listing
+            result = searcher.list_categories()
+        else:
+            # Fetch workflows (optionally filtered by category)
+            result = searcher.search(
+                category=args.category,
+                limit=args.limit
+            )
     
-    print(format_output(result, args.format))
+    print(format_output(result, args.format, compact=compact))
     sys.exit(0 if result.get('success') else 1)
 
 
@@ -0,0 +1,198 @@
+"""
+Shared HTTP client for the taxonomy-resolver scripts.
+
+Keeps keep-alive connections pooled per host so repeated requests skip the
+TCP and TLS handshake, using only the standard library. Errors are raised
+as the same urllib exceptions urlopen uses, so callers keep their existing
+error handling.
+"""
+
+import zlib
+import threading
+import http.client
+from urllib import parse, error
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Bytes read from the socket per step while streaming a response
+CHUNK_SIZE = 64 * 1024
+
+_REDIRECTS = (301, 302, 303, 307, 308)
+
+
+def _iter_gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Decompress a gzip-encoded body chunk by chunk as it arrives."""
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = inflater.decompress(chunk)
+        if data:
+            yield data
+    data = inflater.flush()
+    if data:
+        yield data
+    if not inflater.eof:
+        raise ValueError('Truncated gzip response')
+
+
+class HTTPClient:
+    """Keep-alive HTTP client with a connection pool, safe to share between threads."""
+
+    def __init__(self, headers: Dict[str, str]):
+        """
+        Args:
+            headers: Headers sent with every request
+        """
+        self.headers = headers
+        # Idle keep-alive connections, keyed by (scheme, host)
+        self._connections: Dict[tuple, List[http.client.HTTPConnection]] = {}
+        self._connections_lock = threading.Lock()
+
+    def get(self, url: str, timeout: int, data: Optional[bytes] = None,
+            headers: Optional[Dict[str, str]] = None) -> bytes:
+        """
+        Fetch a URL and return its whole body.
+
+        Args:
+            url: Absolute URL to fetch
+            timeout: Socket timeout in seconds
+            data: Form-encoded body; sends a POST instead of a GET
+            headers: Extra headers for this request
+
+        Returns:
+            Response body, decompressed if it was gzip-encoded
+
+        Raises:
+            urllib.error.HTTPError for error statuses and 204 No Content,
+            urllib.error.URLError for connection failures
+        """
+        return b''.join(self.stream(url, timeout, data, headers))
+
+    def stream(self, url: str, timeout: int, data: Optional[bytes] = None,
+               headers: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+        """
+        Fetch a URL and stream its body as it arrives.
+
+        The status is checked before this returns, so errors are raised
+        here rather than while iterating. The connection goes back to the
+        pool once the body has been read to the end.
+
+        Args:
+            url: Absolute URL to fetch
+            timeout: Socket timeout in seconds
+            data: Form-encoded body; sends a POST instead of a GET
+            headers: Extra headers for this request
+
+        Returns:
+            Iterator over the response body, decompressed if it was
+            gzip-encoded
+
+        Raises:
+            urllib.error.HTTPError for error statuses and 204 No Content,
+            urllib.error.URLError for connection failures
+        """
+        request_headers = self.headers
+        if headers or data is not None:
+            request_headers = {**request_headers, **(headers or {})}
+            if data is not None:
+                request_headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+
+        for _ in range(5):
+            key, conn, response = self._send(url, timeout, data, request_headers)
+            if data is None and response.status in _REDIRECTS and response.getheader('Location'):
+                self._finish(key, conn, response)
+                url = parse.urljoin(url, response.getheader('Location'))
+                continue
+            # 204 No Content is an error too: callers expect a body (ENA
+            # answers 204 when a query matches nothing)
+            if response.status >= 400 or response.status == 204:
+                self._finish(key, conn, response)
+                raise error.HTTPError(url, response.status, response.reason, response.headers, None)
+            body = self._iter_body(key, conn, response)
+            if response.getheader('Content-Encoding') == 'gzip':
+                return _iter_gunzip(body)
+            return body
+        raise error.URLError('Too many redirects')
+
+    def _send(self, url: str, timeout: int, data: Optional[bytes],
+              headers: Dict[str, str]) -> tuple:
+        """Send one request, retrying on a fresh connection if a pooled one went stale."""
+        parts = parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        method = 'GET' if data is None else 'POST'
+
+        with self._connections_lock:
+            idle = self._connections.get(key)
+            conn = idle.pop() if idle else None
+        reused = conn is not None
+
+        while True:
+            if conn is None:
+                if parts.scheme == 'https':
+                    conn = http.client.HTTPSConnection(parts.netloc, timeout=timeout)
+                else:
+                    conn = http.client.HTTPConnection(parts.netloc, timeout=timeout)
+
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                return key, conn, conn.getresponse()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if not reused:
+                    raise error.URLError(e)
+                # The server dropped an idle keep-alive connection; the rest
+                # of the pool went idle at the same time, so retry once on a
+                # fresh connection instead
+                with self._connections_lock:
+                    stale = self._connections.pop(key, [])
+                for idle_conn in stale:
+                    idle_conn.close()
+                conn = None
+                reused = False
+
+    def _iter_body(self, key: tuple, conn: http.client.HTTPConnection,
+                   response: http.client.HTTPResponse) -> Iterator[bytes]:
+        """Yield a response body as it arrives, then release the connection."""
+        complete = False
+        try:
+            while True:
+                try:
+                    chunk = response.read(CHUNK_SIZE)
+                except (OSError, http.client.HTTPException) as e:
+                    raise error.URLError(e)
+                if not chunk:
+                    break
+                yield chunk
+            complete = True
+        finally:
+            # A partly read response leaves the connection unusable
+            if complete:
+                self._release(key, conn, response)
+            else:
+                conn.close()
+
+    def _finish(self, key: tuple, conn: http.client.HTTPConnection,
+                response: http.client.HTTPResponse):
+        """Discard a response body we do not need and release the connection."""
+        try:
+            response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            return
+        self._release(key, conn, response)
+
+    def _release(self, key: tuple, conn: http.client.HTTPConnection,
+                 response: http.client.HTTPResponse):
+        """Return a connection to the pool, unless the server is closing it."""
+        if response.will_close:
+            conn.close()
+        else:
+            with self._connections_lock:
+                self._connections.setdefault(key, []).append(conn)
+
+    def close(self):
+        """Close any idle keep-alive connections."""
+        with self._connections_lock:
+            for idle in self._connections.values():
+                for conn in idle:
+                    conn.close()
+            self._connections.clear()
@@ -11,11 +11,19 @@ Usage:
     python get_bioproject_details.py PRJEB1234 PRJNA456789
 """
 
+import re
 import sys
 import json
 import argparse
-from urllib import request, parse, error
-from typing import Dict, List
+import io
+from concurrent.futures import ThreadPoolExecutor
+from urllib import parse, error
+from typing import Dict, List, Optional
+
+from _http import HTTPClient
+
+# BioProject accessions: PRJ + archive (E=ENA, D=DDBJ, N=NCBI) + type letter + digits
+_ACC_RE = re.compile(r'PRJ[EDN][A-Z]\d+', re.IGNORECASE)
 
 
 class BioprojectDetailsFetcher:
@@ -23,11 +31,42 @@ class BioprojectDetailsFetcher:
     
     BASE_URL = "https://www.ebi.ac.uk/ena/portal/api"
     
+    # Fields to retrieve for study details
+    STUDY_FIELDS = [
+        'study_accession',
+        'study_title',
+        'study_description',
+        'study_alias',
+        'center_name',
+        'first_public',
+        'last_updated',
+        'scientific_name',
+        'tax_id'
+    ]
+    
+    # Maximum concurrent requests when fetching several bioprojects
+    MAX_WORKERS = 8
+    
+    # Accessions per batched ENA query
+    BATCH_SIZE = 100
+    
     def __init__(self):
         self.session_headers = {
             'User-Agent': 'Claude-BioprojectFetcher/1.0',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip'
         }
+        self._http = HTTPClient(self.session_headers)
+
+    def close(self):
+        """Close any idle keep-alive connections."""
+        self._http.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
     
     def get_details(self, bioproject_accession: str) -> Dict:
         """
@@ -39,56 +78,35 @@ class BioprojectDetailsFetcher:
         Returns:
             Dictionary with bioproject details
         """
-        # Fields to retrieve for study details
-        fields = [
-            'study_accession',
-            'study_title',
-            'study_description',
-            'study_alias',
-            'center_name',
-            'first_public',
-            'last_updated',
-            'scientific_name',
-            'tax_id'
-        ]
+        # Malformed accessions can never match; skip the round-trip
+        if not _ACC_RE.fullmatch(bioproject_accession):
+            return self._invalid(bioproject_accession)
         
         # Build query URL
         params = {
             'result': 'study',
             'query': f'study_accession={bioproject_accession}',
             'format': 'json',
-            'fields': ','.join(fields)
+            'fields': ','.join(self.STUDY_FIELDS)
         }
         
         search_url = f"{self.BASE_URL}/search?{parse.urlencode(params)}"
         
         try:
-            req = request.Request(search_url, headers=self.session_headers)
-            with request.urlopen(req, timeout=30) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                
-                if isinstance(data, list) and len(data) > 0:
-                    return {
-                        'success': True,
-                        'accession': bioproject_accession,
-                        'details': data[0]
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'accession': bioproject_accession,
-                        'error': 'BioProject not found',
-                        'suggestion': 'Check that the accession is correct'
-                    }
-                    
-        except error.HTTPError as e:
-            if e.code == 204:
+            data = json.loads(self._http.get(search_url, timeout=30))
+            
+            if isinstance(data, list) and len(data) > 0:
                 return {
-                    'success': False,
+                    'success': True,
                     'accession': bioproject_accession,
-                    'error': 'BioProject not found',
-                    'suggestion': 'Check that the accession is correct'
+                    'details': data[0]
                 }
+            else:
+                return self._not_found(bioproject_accession)
+                
+        except error.HTTPError as e:
+            if e.code == 204:
+                return self._not_found(bioproject_accession)
             return {
                 'success': False,
                 'accession': bioproject_accession,
@@ -109,10 +127,98 @@ class BioprojectDetailsFetcher:
                 'error': f'Unexpected error: {str(e)}'
             }
     
+    def _not_found(self, bioproject_accession: str) -> Dict:
+        """Build the result returned for an accession ENA has no study for."""
+        return {
+            'success': False,
+            'accession': bioproject_accession,
+            'error': 'BioProject not found',
+            'suggestion': 'Check that the accession is correct'
+        }
+    
+    def _invalid(self, bioproject_accession: str) -> Dict:
+        """Build the result returned for a string that is not a BioProject accession."""
+        return {
+            'success': False,
+            'accession': bioproject_accession,
+            'error': 'Invalid accession format',
+            'suggestion': 'BioProject accessions look like PRJEB1234, PRJNA123456 or PRJDB7788'
+        }
+    
+    def _get_batch(self, accessions: List[str]) -> List[Dict]:
+        """
+        Look up several bioprojects with a single ENA query.
+        
+        Args:
+            accessions: List of bioproject accessions
+            
+        Returns:
+            List of per-accession results, in input order
+            
+        Raises:
+            urllib.error.URLError or ValueError if the batch query fails
+        """
+        valid = [accession for accession in accessions if _ACC_RE.fullmatch(accession)]
+        if not valid:
+            return [self._invalid(accession) for accession in accessions]
+        
+        query = ' OR '.join(f'study_accession="{accession}"' for accession in valid)
+        params = {
+            'result': 'study',
+            'query': query,
+            'format': 'json',
+            'fields': ','.join(self.STUDY_FIELDS),
+            'limit': 0
+        }
+        
+        # POST keeps long accession lists out of the URL
+        try:
+            body = self._http.get(f"{self.BASE_URL}/search", timeout=30,
+                                  data=parse.urlencode(params).encode('utf-8'))
+            data = json.loads(body)
+        except error.HTTPError as e:
+            if e.code != 204:
+                raise
+            data = []
+        
+        if not isinstance(data, list):
+            raise ValueError('Unexpected response from ENA')
+        
+        studies = {
+            study.get('study_accession', '').upper(): study
+            for study in data
+        }
+        
+        results = []
+        for accession in accessions:
+            details = studies.get(accession.upper())
+            if not _ACC_RE.fullmatch(accession):
+                results.append(self._invalid(accession))
+            elif details is None:
+                results.append(self._not_found(accession))
+            else:
+                results.append({
+                    'success': True,
+                    'accession': accession,
+                    'details': details
+                })
+        return results
+    
+    def _try_batch(self, accessions: List[str]) -> Optional[List[Dict]]:
+        """Run a batched lookup, returning None instead of raising on failure."""
+        try:
+            return self._get_batch(accessions)
+        except Exception:
+            return None
+    
     def get_multiple_details(self, accessions: List[str]) -> Dict:
         """
         Get details for multiple bioprojects.
         
+        Accessions are fetched with batched ENA queries of up to BATCH_SIZE
+        accessions each, sent concurrently over the shared connection pool.
+        If a batch fails, its accessions are looked up individually instead.
+        
         Args:
             accessions: List of bioproject accessions
             
@@ -120,9 +226,23 @@ class BioprojectDetailsFetcher:
             Dictionary with results for each accession
         """
         results = []
-        for accession in accessions:
-            result = self.get_details(accession)
-            results.append(result)
+        if accessions:
+            chunks = [accessions[i:i + self.BATCH_SIZE]
+                      for i in range(0, len(accessions), self.BATCH_SIZE)]
+            
+            # Lookups are independent and I/O bound; run them concurrently
+            # (map preserves input order)
+            with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+                batches = list(executor.map(self._try_batch, chunks))
+                failed = [accession
+                          for chunk, batch in zip(chunks, batches) if batch is None
+                          for accession in chunk]
+                fallback = iter(list(executor.map(self.get_details, failed)))
+            
+            for chunk, batch in zip(chunks, batches):
+                if batch is None:
+                    batch = [next(fallback) for _ in chunk]
+                results.extend(batch)
         
         return {
             'success': True,
@@ -131,50 +251,82 @@ class BioprojectDetailsFetcher:
         }
 
 
-def format_output(data: Dict, format_type: str = 'human') -> str:
+def _dump_json(data: Dict, compact: bool) -> str:
+    """Serialize data as indented JSON, or compact JSON when compact is set."""
+    if compact:
+        return json.dumps(data, separators=(',', ':'))
+    return json.dumps(data, indent=2)
+
+
+# Fixed pieces of the human-readable multi-project listing
+_RULE = "=" * 60 + "\n"
+_SEPARATOR = "-" * 60 + "\n"
+_PROJECT_TEMPLATE = (
+    "\nBioProject: {accession}\n"
+    "Title: {study_title}\n"
+    "Description: {description}\n"
+    "Organism: {scientific_name} (Tax ID: {tax_id})\n"
+    "Center: {center_name}\n"
+    "First Public: {first_public}\n"
+    "Last Updated: {last_updated}\n"
+)
+
+
+class _Fields(dict):
+    """Template fields that fall back to 'N/A' when ENA omits them."""
+    
+    def __missing__(self, key):
+        return 'N/A'
+
+
+def _truncate(text: str, width: int) -> str:
+    """Cut text to width characters, ending in '...' when shortened."""
+    if len(text) > width:
+        return text[:width - 3] + '...'
+    return text
+
+
+def format_output(data: Dict, format_type: str = 'human', compact: bool = False) -> str:
     """
     Format the bioproject details for output.
     
     Args:
         data: Bioproject details dictionary
         format_type: 'json' or 'human'
+        compact: Emit JSON without indentation (for piping to other programs)
         
     Returns:
         Formatted string
     """
     if format_type == 'json':
-        return json.dumps(data, indent=2)
+        return _dump_json(data, compact)
     
     # Handle multiple results
     if 'results' in data:
-        output = []
-        output.append(f"Retrieved details for {data['count']} BioProject(s)")
-        output.append("="*60)
+        buf = io.StringIO()
+        write = buf.write
+        write(f"Retrieved details for {data['count']} BioProject(s)\n")
+        write(_RULE)
         
         for result in data['results']:
             if result['success']:
                 details = result['details']
-                output.append(f"\nBioProject: {result['accession']}")
-                output.append(f"Title: {details.get('study_title', 'N/A')}")
-                
                 description = details.get('study_description', 'N/A')
-                if description and len(description) > 200:
-                    description = description[:197] + '...'
-                output.append(f"Description: {description}")
-                
-                output.append(f"Organism: {details.get('scientific_name', 'N/A')} (Tax ID: {details.get('tax_id', 'N/A')})")
-                output.append(f"Center: {details.get('center_name', 'N/A')}")
-                output.append(f"First Public: {details.get('first_public', 'N/A')}")
-                output.append(f"Last Updated: {details.get('last_updated', 'N/A')}")
+                if description:
+                    description = _truncate(description, 200)
+                write(_PROJECT_TEMPLATE.format_map(
+                    _Fields(details, accession=result['accession'], description=description)
+                ))
             else:
-                output.append(f"\nBioProject: {result['accession']}")
-                output.append(f"Error: {result.get('error', 'Unknown error')}")
+                write(f"\nBioProject: {result['accession']}\n")
+                write(f"Error: {result.get('error', 'Unknown error')}\n")
                 if result.get('suggestion'):
-                    output.append(f"Suggestion: {result['suggestion']}")
+                    write(f"Suggestion: {result['suggestion']}\n")
             
-            output.append("-"*60)
+            write(_SEPARATOR)
         
-        return '\n'.join(output)
+        # Drop the final newline so the result matches the single-project output
+        return buf.getvalue()[:-1]
     
     # Handle single result
     if not data.get('success'):
@@ -222,14 +374,13 @@ Note: Accepts both PRJEB (ENA) and PRJNA (NCBI) accessions.
     
     args = parser.parse_args()
     
-    fetcher = BioprojectDetailsFetcher()
-    
-    if len(args.accessions) == 1:
-        result = fetcher.get_details(args.accessions[0])
-    else:
-        result = fetcher.get_multiple_details(args.accessions)
+    with BioprojectDetailsFetcher() as fetcher:
+        if len(args.accessions) == 1:
+            result = fetcher.get_details(args.accessions[0])
+        else:
+            result = fetcher.get_multiple_details(args.accessions)
     
-    print(format_output(result, args.format))
+    print(format_output(result, args.format, compact=not sys.stdout.isatty()))
     
     # Exit with error code if any lookups failed
     if 'results' in result:
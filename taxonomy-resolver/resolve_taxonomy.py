@@ -12,41 +12,141 @@ Usage:
     python resolve_taxonomy.py "Mus musculus" --detailed
 """
 
+import os
 import sys
 import json
+import time
 import argparse
-from urllib import request, parse, error
+import sqlite3
+from urllib import parse, error
 from typing import Dict, List, Optional
 
+from _http import HTTPClient
+
 
 class NCBITaxonomyResolver:
     """Handler for NCBI Taxonomy API queries."""
     
     BASE_URL = "https://api.ncbi.nlm.nih.gov"
     
-    def __init__(self):
+    # How long cached lookups are trusted (seconds); taxonomy changes rarely
+    NAME_CACHE_TTL = 7 * 24 * 60 * 60
+    TAX_ID_CACHE_TTL = 30 * 24 * 60 * 60
+    
+    def __init__(self, cache_path: Optional[str] = None, refresh: bool = False):
+        """
+        Args:
+            cache_path: SQLite file for cached lookups
+                (default: $XDG_CACHE_HOME/taxonomy/resolver.db or ~/.cache/taxonomy/resolver.db)
+            refresh: Ignore cached lookups and query NCBI again
+        """
+        if cache_path is None:
+            cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            cache_path = os.path.join(cache_root, 'taxonomy', 'resolver.db')
+        self.cache_path = cache_path
+        self.refresh = refresh
+        self._cache_db: Optional[sqlite3.Connection] = None
+        self._cache_failed = False
         self.session_headers = {
             'User-Agent': 'Claude-TaxonomyResolver/1.0',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip'
         }
+        self._http = HTTPClient(self.session_headers)
+
+    def close(self):
+        """Close any idle keep-alive connections and the lookup cache."""
+        self._http.close()
+        if self._cache_db is not None:
+            self._cache_db.close()
+            self._cache_db = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _open_cache(self) -> Optional[sqlite3.Connection]:
+        """
+        Open the on-disk lookup cache, creating it if needed.
+        
+        Caching is best-effort: if the database cannot be opened, lookups
+        simply go to NCBI every time.
+        """
+        if self._cache_db is None and not self._cache_failed:
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                db = sqlite3.connect(self.cache_path)
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS cache '
+                    '(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)'
+                )
+                self._cache_db = db
+            except (OSError, sqlite3.Error):
+                self._cache_failed = True
+        return self._cache_db
+    
+    def _cache_get(self, key: str, ttl: int):
+        """
+        Look up a cached value.
+        
+        Args:
+            key: Cache key
+            ttl: Maximum age in seconds
+            
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        if self.refresh:
+            return None
+        db = self._open_cache()
+        if db is None:
+            return None
+        try:
+            row = db.execute('SELECT value, stored_at FROM cache WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or time.time() - row[1] > ttl:
+            return None
+        return json.loads(row[0])
+    
+    def _cache_put(self, key: str, value):
+        """Store a value in the lookup cache, ignoring cache failures."""
+        db = self._open_cache()
+        if db is None:
+            return
+        try:
+            with db:
+                db.execute(
+                    'INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), time.time())
+                )
+        except sqlite3.Error:
+            pass
     
-    def search_by_name(self, organism_name: str) -> Optional[Dict]:
+    def search_by_name(self, organism_name: str, detailed: bool = True) -> Optional[Dict]:
         """
         Search for an organism by name and return taxonomy information.
         
         Args:
             organism_name: Scientific or common name of the organism
+            detailed: Fetch the full taxonomy record, including lineage. When
+                False, the best taxon_suggest match is returned as-is, which
+                saves a second request.
             
         Returns:
             Dictionary with taxonomy information or None if not found
         """
-        # First, search for the taxonomy ID
-        search_url = f"{self.BASE_URL}/datasets/v2/taxonomy/taxon_suggest/{parse.quote(organism_name)}"
+        name_key = f'name:{organism_name.strip().lower()}'
+        match = self._cache_get(name_key, self.NAME_CACHE_TTL)
         
-        try:
-            req = request.Request(search_url, headers=self.session_headers)
-            with request.urlopen(req, timeout=10) as response:
-                data = json.loads(response.read().decode('utf-8'))
+        if match is None:
+            # First, search for the taxonomy ID
+            search_url = f"{self.BASE_URL}/datasets/v2/taxonomy/taxon_suggest/{parse.quote(organism_name)}"
+            
+            try:
+                data = json.loads(self._http.get(search_url, timeout=10))
                 
                 if not data.get('sci_name_and_ids'):
                     return None
@@ -62,13 +162,24 @@ class NCBITaxonomyResolver:
                 if not tax_id:
                     return None
                 
-                # Now get detailed information for this tax ID
-                return self.get_by_tax_id(tax_id)
+                match = {
+                    'tax_id': int(tax_id),
+                    'scientific_name': top_result.get('sci_name'),
+                    'common_name': top_result.get('common_name'),
+                    'rank': top_result.get('rank')
+                }
+                self._cache_put(name_key, match)
                 
-        except error.URLError as e:
-            return {'error': f'Network error: {str(e)}', 'suggestion': 'Check network settings and ensure api.ncbi.nlm.nih.gov is allowlisted'}
-        except Exception as e:
-            return {'error': f'Unexpected error: {str(e)}'}
+            except error.URLError as e:
+                return {'error': f'Network error: {str(e)}', 'suggestion': 'Check network settings and ensure api.ncbi.nlm.nih.gov is allowlisted'}
+            except Exception as e:
+                return {'error': f'Unexpected error: {str(e)}'}
+        
+        if not detailed:
+            return match
+        
+        # Now get detailed information for this tax ID
+        return self.get_by_tax_id(match['tax_id'])
     
     def get_by_tax_id(self, tax_id: int) -> Optional[Dict]:
         """
@@ -80,42 +191,99 @@ class NCBITaxonomyResolver:
         Returns:
             Dictionary with detailed taxonomy information
         """
-        detail_url = f"{self.BASE_URL}/datasets/v2/taxonomy/taxon/{tax_id}"
+        return self.get_by_tax_ids([tax_id])[0]
+    
+    def get_by_tax_ids(self, tax_ids: List[int]) -> List[Optional[Dict]]:
+        """
+        Get detailed taxonomy information for several taxonomy IDs.
         
-        try:
-            req = request.Request(detail_url, headers=self.session_headers)
-            with request.urlopen(req, timeout=10) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                
-                if 'taxonomy_nodes' not in data or not data['taxonomy_nodes']:
-                    return None
+        IDs that are not cached are fetched together in one request.
+        
+        Args:
+            tax_ids: NCBI taxonomy IDs
+            
+        Returns:
+            List of taxonomy dictionaries in the same order as tax_ids
+            (None where an ID was not found)
+        """
+        results: Dict[int, Optional[Dict]] = {}
+        missing = []
+        for tax_id in tax_ids:
+            tax_id = int(tax_id)
+            if tax_id in results:
+                continue
+            cached = self._cache_get(f'tax_id:{tax_id}', self.TAX_ID_CACHE_TTL)
+            results[tax_id] = cached
+            if cached is None:
+                missing.append(tax_id)
+        
+        if missing:
+            detail_url = f"{self.BASE_URL}/datasets/v2/taxonomy/taxon/{','.join(map(str, missing))}"
+            
+            try:
+                data = json.loads(self._http.get(detail_url, timeout=10))
                 
-                node = data['taxonomy_nodes'][0]
-                taxonomy = node.get('taxonomy', {})
-
-                # Get common name from multiple possible fields
-                common_name = None
-                if taxonomy.get('common_names'):
-                    common_name = taxonomy['common_names'][0]
-                elif taxonomy.get('genbank_common_name'):
-                    common_name = taxonomy['genbank_common_name']
-
-                return {
-                    'tax_id': taxonomy.get('tax_id'),
-                    'scientific_name': taxonomy.get('organism_name'),
-                    'common_name': common_name,
-                    'rank': taxonomy.get('rank'),
-                    'lineage': taxonomy.get('lineage', []),
-                    'parent_tax_id': taxonomy.get('parent_tax_id')
-                }
+                for node in data.get('taxonomy_nodes') or []:
+                    taxonomy = node.get('taxonomy')
+                    if not taxonomy:
+                        continue
+                    
+                    result = self._parse_taxonomy(taxonomy)
+                    # Merged IDs come back under their current tax_id, so
+                    # match nodes on the query that produced them as well
+                    for key in [taxonomy.get('tax_id')] + node.get('query', []):
+                        try:
+                            key = int(key)
+                        except (TypeError, ValueError):
+                            continue
+                        if key in results and results[key] is None:
+                            results[key] = result
+                            self._cache_put(f'tax_id:{key}', result)
                 
-        except error.URLError as e:
-            return {'error': f'Network error: {str(e)}', 'suggestion': 'Check network settings and ensure api.ncbi.nlm.nih.gov is allowlisted'}
-        except Exception as e:
-            return {'error': f'Unexpected error: {str(e)}'}
+            except error.URLError as e:
+                failure = {'error': f'Network error: {str(e)}', 'suggestion': 'Check network settings and ensure api.ncbi.nlm.nih.gov is allowlisted'}
+                results.update((tax_id, failure) for tax_id in missing)
+            except Exception as e:
+                failure = {'error': f'Unexpected error: {str(e)}'}
+                results.update((tax_id, failure) for tax_id in missing)
+        
+        return [results[int(tax_id)] for tax_id in tax_ids]
+    
+    def _parse_taxonomy(self, taxonomy: Dict) -> Dict:
+        """
+        Convert an NCBI taxonomy record into the resolver's result format.
+        
+        Args:
+            taxonomy: The 'taxonomy' object of a taxonomy node
+            
+        Returns:
+            Dictionary with detailed taxonomy information
+        """
+        # Get common name from multiple possible fields
+        common_name = None
+        if taxonomy.get('common_names'):
+            common_name = taxonomy['common_names'][0]
+        elif taxonomy.get('genbank_common_name'):
+            common_name = taxonomy['genbank_common_name']
 
+        return {
+            'tax_id': taxonomy.get('tax_id'),
+            'scientific_name': taxonomy.get('organism_name'),
+            'common_name': common_name,
+            'rank': taxonomy.get('rank'),
+            'lineage': taxonomy.get('lineage', []),
+            'parent_tax_id': taxonomy.get('parent_tax_id')
+        }
+
+
+def _dump_json(data: Dict, compact: bool) -> str:
+    """Serialize data as indented JSON, or compact JSON when compact is set."""
+    if compact:
+        return json.dumps(data, separators=(',', ':'))
+    return json.dumps(data, indent=2)
 
-def format_output(data: Dict, format_type: str = 'human', detailed: bool = False) -> str:
+
+def format_output(data: Dict, format_type: str = 'human', detailed: bool = False, compact: bool = False) -> str:
     """
     Format the taxonomy data for output.
     
@@ -123,20 +291,21 @@ def format_output(data: Dict, format_type: str = 'human', detailed: bool = False
         data: Taxonomy data dictionary
         format_type: 'json' or 'human'
         detailed: Include full lineage information
+        compact: Emit JSON without indentation (for piping to other programs)
         
     Returns:
         Formatted string
     """
     if 'error' in data:
         if format_type == 'json':
-            return json.dumps(data, indent=2)
+            return _dump_json(data, compact)
         else:
             error_msg = data['error']
             suggestion = data.get('suggestion', '')
             return f"Error: {error_msg}\n{suggestion}"
     
     if format_type == 'json':
-        return json.dumps(data, indent=2)
+        return _dump_json(data, compact)
     
     # Human-readable format
     output = []
@@ -146,7 +315,8 @@ def format_output(data: Dict, format_type: str = 'human', detailed: bool = False
     if data.get('common_name'):
         output.append(f"Common Name: {data['common_name']}")
     
-    output.append(f"Rank: {data['rank']}")
+    if data.get('rank'):
+        output.append(f"Rank: {data['rank']}")
 
     if detailed and data.get('lineage'):
         output.append(f"\nLineage (taxonomy IDs): {', '.join(map(str, data['lineage']))}")
@@ -175,15 +345,16 @@ Examples:
                        help='Output format (default: human)')
     parser.add_argument('--detailed', action='store_true',
                        help='Include detailed lineage information')
+    parser.add_argument('--refresh', action='store_true',
+                       help='Ignore cached lookups and query NCBI again')
     
     args = parser.parse_args()
     
-    resolver = NCBITaxonomyResolver()
-    
-    if args.tax_id:
-        result = resolver.get_by_tax_id(args.tax_id)
-    else:
-        result = resolver.search_by_name(args.organism_name)
+    with NCBITaxonomyResolver(refresh=args.refresh) as resolver:
+        if args.tax_id:
+            result = resolver.get_by_tax_id(args.tax_id)
+        else:
+            result = resolver.search_by_name(args.organism_name, detailed=args.detailed)
     
     if result is None:
         if args.format == 'json':
@@ -192,7 +363,7 @@ Examples:
             print(f"No results found for '{args.organism_name if args.organism_name else args.tax_id}'")
         sys.exit(1)
     
-    print(format_output(result, args.format, args.detailed))
+    print(format_output(result, args.format, args.detailed, compact=not sys.stdout.isatty()))
     sys.exit(0 if 'error' not in result else 1)
 
 
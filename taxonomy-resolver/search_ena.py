@@ -11,11 +11,145 @@ Usage:
     python search_ena.py "Homo sapiens" --format json
 """
 
+import re
 import sys
 import json
+import codecs
+import io
+import math
+import functools
+import heapq
 import argparse
-from urllib import request, parse, error
-from typing import Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from urllib import parse, error
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from _http import HTTPClient
+
+# JSON insignificant whitespace
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Markers of a query already written in ENA search syntax
+_ENA_SYNTAX_RE = re.compile(r'tax_eq|tax_tree|study_accession|sample_accession|run_accession|=')
+
+
+def _run_count(study: Tuple[str, List[Dict]]) -> int:
+    """Sort key for (study accession, runs) pairs: the number of runs."""
+    return len(study[1])
+
+
+def _iter_json_array(chunks: Iterable[bytes]) -> Iterator:
+    """
+    Decode a top-level JSON array element by element as its bytes arrive.
+    
+    Each element is decoded as soon as it is complete, so parsing overlaps
+    with the download instead of waiting for the whole body. A body that
+    is valid JSON but not an array yields nothing.
+    
+    Args:
+        chunks: The UTF-8 encoded body, in pieces
+        
+    Yields:
+        Decoded array elements
+        
+    Raises:
+        ValueError if the body is not valid JSON, including anything but
+        whitespace after the closing bracket
+    """
+    # Decoding element by element would give every row its own copy of each
+    # field name; intern them so all rows (and responses) share one string
+    intern = sys.intern
+    decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {intern(k): v for k, v in pairs})
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    text = ''
+    pos = 0
+    eof = False
+    # Next expected token: '[' to open, an element, or ',' / ']' after one
+    state = 'open'
+    first = True
+    
+    while True:
+        pos = _WHITESPACE.match(text, pos).end()
+        
+        if pos < len(text):
+            if state == 'open':
+                if text[pos] != '[':
+                    # Not an array; decode the rest only to validate it
+                    rest = ''.join(utf8.decode(chunk) for chunk in chunks)
+                    decoder.decode(text[pos:] + rest + utf8.decode(b'', final=True))
+                    return
+                pos += 1
+                state = 'element'
+                continue
+            
+            if state == 'element':
+                if first and text[pos] == ']':
+                    break
+                try:
+                    element, end = decoder.raw_decode(text, pos)
+                except json.JSONDecodeError:
+                    # Most likely an element split across chunks
+                    if eof:
+                        raise
+                else:
+                    # Only trust a value once the delimiter after it has
+                    # arrived; a number cut off mid-chunk would decode short
+                    after = _WHITESPACE.match(text, end).end()
+                    if after < len(text) and text[after] in ',]':
+                        yield element
+                        first = False
+                        if text[after] == ']':
+                            pos = after
+                            break
+                        pos = after + 1
+                        continue
+                    if eof:
+                        yield element
+                        pos = end
+                        state = 'separator'
+                        first = False
+                        continue
+            
+            elif text[pos] == ',':
+                pos += 1
+                state = 'element'
+                continue
+            elif text[pos] == ']':
+                break
+            else:
+                raise ValueError(f'Malformed JSON array at character {pos}')
+        
+        if eof:
+            if state == 'open':
+                # Empty body; raise the usual "Expecting value" error
+                decoder.decode(text)
+            raise ValueError('Truncated JSON array')
+        
+        chunk = next(chunks, None)
+        text = text[pos:]
+        pos = 0
+        if chunk is None:
+            eof = True
+            text += utf8.decode(b'', final=True)
+        else:
+            text += utf8.decode(chunk)
+    
+    # Read past the closing bracket so the source sees the end of the body;
+    # only whitespace may follow it
+    tail = text[pos + 1:]
+    for chunk in chunks:
+        tail += utf8.decode(chunk)
+        if tail.strip(' \t\n\r'):
+            break
+        tail = ''
+    tail += utf8.decode(b'', final=True)
+    if tail.strip(' \t\n\r'):
+        raise ValueError('Extra data after JSON array')
 
 
 class ENASearcher:
@@ -36,13 +170,114 @@ class ENASearcher:
         'taxon': 'taxon'            # Taxonomy information
     }
     
+    # Default fields for different result types
+    DEFAULT_FIELDS = {
+        'read_run': [
+            'run_accession', 'study_accession', 'sample_accession',
+            'scientific_name', 'instrument_platform', 'library_layout',
+            'fastq_ftp', 'fastq_bytes', 'library_strategy', 'study_title'
+        ],
+        'assembly': [
+            'accession', 'scientific_name', 'assembly_level',
+            'genome_representation', 'assembly_name', 'assembly_title'
+        ],
+        'study': [
+            'study_accession', 'study_title', 'study_alias',
+            'scientific_name', 'study_description'
+        ],
+        'sample': [
+            'sample_accession', 'scientific_name', 'collection_date',
+            'country', 'host', 'isolation_source'
+        ]
+    }
+    
+    # Fields for result types not listed in DEFAULT_FIELDS
+    FALLBACK_FIELDS = ['accession', 'scientific_name']
+    
+    # URL-encoded field lists, built once rather than per search
+    _ENCODED_FIELDS = {
+        result_type: parse.quote_plus(','.join(fields))
+        for result_type, fields in DEFAULT_FIELDS.items()
+    }
+    _ENCODED_FALLBACK_FIELDS = parse.quote_plus(','.join(FALLBACK_FIELDS))
+    
+    # Fields needed to build FASTQ download URLs
+    FASTQ_FIELDS = ['run_accession', 'fastq_ftp', 'fastq_md5', 'fastq_bytes']
+    
+    # Search path and query for a single run's FASTQ fields
+    _SINGLE_RUN_PATH = (
+        "/search?result=read_run&query=run_accession%3D%22{accession}%22"
+        "&limit=1&offset=0&format=json&fields=" + parse.quote_plus(','.join(FASTQ_FIELDS))
+    )
+    
+    # Run accessions per batched ENA query
+    BATCH_SIZE = 100
+    
+    # Maximum concurrent requests when running several queries
+    MAX_WORKERS = 8
+    
+    # Searches with a larger limit are split into PAGE_WORKERS concurrent
+    # pages of at least this many rows
+    PAGE_SIZE = 100
+    PAGE_WORKERS = 4
+    
+    # In-memory cache of search responses: entries kept, and seconds trusted
+    CACHE_SIZE = 256
+    CACHE_TTL = 60 * 60
+    
     def __init__(self):
         self.session_headers = {
             'User-Agent': 'Claude-ENASearcher/1.0',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip'
         }
+        self._http = HTTPClient(self.session_headers)
+        # Decoded rows per search URL, least recently used first
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def close(self):
+        """Close any idle keep-alive connections."""
+        self._http.close()
 
-    def _format_query(self, query: str) -> str:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _cache_get(self, url: str) -> Optional[List[Dict]]:
+        """
+        Look up the rows cached for a search URL.
+        
+        Args:
+            url: Search URL
+            
+        Returns:
+            The cached rows, or None if missing or expired
+        """
+        with self._cache_lock:
+            entry = self._cache.get(url)
+            if entry is None:
+                return None
+            stored_at, rows = entry
+            if time.monotonic() - stored_at > self.CACHE_TTL:
+                del self._cache[url]
+                return None
+            self._cache.move_to_end(url)
+            return rows
+    
+    def _cache_put(self, url: str, rows: List[Dict]):
+        """Store the rows for a search URL, evicting the least recently used."""
+        with self._cache_lock:
+            self._cache[url] = (time.monotonic(), rows)
+            self._cache.move_to_end(url)
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _format_query(query: str) -> str:
         """
         Format query for ENA API.
 
@@ -58,7 +293,7 @@ class ENASearcher:
             Properly formatted ENA query
         """
         # If query already uses ENA syntax, return as-is
-        if any(op in query for op in ['tax_eq', 'tax_tree', 'study_accession', 'sample_accession', 'run_accession', '=']):
+        if _ENA_SYNTAX_RE.search(query):
             return query
 
         # If query is a number, treat as taxonomy ID
@@ -69,41 +304,51 @@ class ENASearcher:
         # This works across all result types (read_run, assembly, etc.)
         return f'scientific_name="{query}"'
 
-    def _group_by_bioproject(self, results: List[Dict]) -> List[Dict]:
+    def _group_by_bioproject(self, results: List[Dict], top_k: Optional[int] = None) -> Tuple[List[Dict], int]:
         """
         Group read run results by bioproject (study_accession).
         
         Args:
             results: List of read run results
+            top_k: Only return the top_k bioprojects with the most runs
             
         Returns:
-            List of bioproject groups with accession, read count, and runs
+            List of bioproject groups with accession, read count, and runs,
+            and the total number of bioprojects before any top_k cut
         """
-        from collections import defaultdict
-        
-        bioprojects = defaultdict(lambda: {'runs': [], 'study_title': None})
-        
+        # Bucket runs by study in one pass over the results
+        runs_by_study = {}
         for result in results:
             study_acc = result.get('study_accession', 'Unknown')
-            bioprojects[study_acc]['runs'].append(result)
-            # Capture study title if available
-            if result.get('study_title') and not bioprojects[study_acc]['study_title']:
-                bioprojects[study_acc]['study_title'] = result.get('study_title')
+            runs = runs_by_study.get(study_acc)
+            if runs is None:
+                runs_by_study[study_acc] = [result]
+            else:
+                runs.append(result)
+        
+        # Pick the largest studies before building their group dicts
+        # (nlargest orders ties the same way a stable sort would)
+        if top_k is None:
+            studies = sorted(runs_by_study.items(), key=_run_count, reverse=True)
+        else:
+            studies = heapq.nlargest(top_k, runs_by_study.items(), key=_run_count)
         
-        # Convert to list format
         grouped = []
-        for study_acc, data in bioprojects.items():
+        for study_acc, runs in studies:
+            # Use the first study title available; usually on the first run
+            study_title = None
+            for run in runs:
+                study_title = run.get('study_title')
+                if study_title:
+                    break
             grouped.append({
                 'bioproject_accession': study_acc,
-                'read_count': len(data['runs']),
-                'study_title': data['study_title'],
-                'runs': data['runs']
+                'read_count': len(runs),
+                'study_title': study_title or None,
+                'runs': runs
             })
         
-        # Sort by read count (descending)
-        grouped.sort(key=lambda x: x['read_count'], reverse=True)
-        
-        return grouped
+        return grouped, len(runs_by_study)
     
     def search(
         self,
@@ -111,7 +356,9 @@ class ENASearcher:
         result_type: str = 'read_run',
         limit: int = 10,
         offset: int = 0,
-        fields: Optional[List[str]] = None
+        fields: Optional[List[str]] = None,
+        top_k: Optional[int] = None,
+        group_by_bioproject: bool = True
     ) -> Dict:
         """
         Search ENA for genomic data.
@@ -122,77 +369,67 @@ class ENASearcher:
             limit: Maximum number of results to return
             offset: Number of results to skip (for pagination)
             fields: Specific fields to return (None = default fields)
+            top_k: Only group the top_k bioprojects with the most runs
+                (read_run only, at least 1; total_bioprojects still counts
+                all of them)
+            group_by_bioproject: Group read_run results by bioproject; turn
+                off when only the runs themselves are needed
             
         Returns:
             Dictionary with search results
         """
-        # Default fields for different result types
-        default_fields = {
-            'read_run': [
-                'run_accession', 'study_accession', 'sample_accession',
-                'scientific_name', 'instrument_platform', 'library_layout',
-                'fastq_ftp', 'fastq_bytes', 'library_strategy', 'study_title'
-            ],
-            'assembly': [
-                'accession', 'scientific_name', 'assembly_level',
-                'genome_representation', 'assembly_name', 'assembly_title'
-            ],
-            'study': [
-                'study_accession', 'study_title', 'study_alias',
-                'scientific_name', 'study_description'
-            ],
-            'sample': [
-                'sample_accession', 'scientific_name', 'collection_date',
-                'country', 'host', 'isolation_source'
-            ]
-        }
+        if top_k is not None and top_k < 1:
+            return {
+                'success': False,
+                'error': f'top_k must be at least 1, got {top_k}'
+            }
         
         if fields is None:
-            fields = default_fields.get(result_type, ['accession', 'scientific_name'])
+            encoded_fields = self._ENCODED_FIELDS.get(result_type, self._ENCODED_FALLBACK_FIELDS)
+        else:
+            encoded_fields = parse.quote_plus(','.join(fields))
 
         # Format the query for ENA API
         formatted_query = self._format_query(query)
 
-        # Build the query URL
-        params = {
-            'result': result_type,
-            'query': formatted_query,
-            'limit': limit,
-            'offset': offset,
-            'format': 'json',
-            'fields': ','.join(fields)
-        }
-        
-        search_url = f"{self.BASE_URL}/search?{parse.urlencode(params)}"
+        # Build the query URL prefix (the same string urlencode would produce)
+        search_url = (
+            f"{self.BASE_URL}/search?result={parse.quote_plus(result_type)}"
+            f"&query={parse.quote_plus(formatted_query)}"
+        )
+        url_suffix = f"&format=json&fields={encoded_fields}"
         
         try:
-            req = request.Request(search_url, headers=self.session_headers)
-            with request.urlopen(req, timeout=30) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                
-                results = data if isinstance(data, list) else []
-                
-                # Group by bioproject if this is a read_run search
-                if result_type == 'read_run' and results:
-                    grouped = self._group_by_bioproject(results)
-                    return {
-                        'success': True,
-                        'query': query,
-                        'result_type': result_type,
-                        'count': len(results),
-                        'total_bioprojects': len(grouped),
-                        'results': results,
-                        'grouped_by_bioproject': grouped
-                    }
-                
+            if limit > self.PAGE_SIZE:
+                rows = self._fetch_pages(search_url, url_suffix, limit, offset)
+            else:
+                rows = self._fetch_rows(f"{search_url}&limit={limit}&offset={offset}{url_suffix}")
+            
+            # Callers may modify the rows they get back, so hand out copies;
+            # ENA row values are flat scalars, so a shallow copy suffices
+            results = [dict(row) for row in rows]
+            
+            # Group by bioproject if this is a read_run search
+            if group_by_bioproject and result_type == 'read_run' and results:
+                grouped, total_bioprojects = self._group_by_bioproject(results, top_k)
                 return {
                     'success': True,
                     'query': query,
                     'result_type': result_type,
                     'count': len(results),
-                    'results': results
+                    'total_bioprojects': total_bioprojects,
+                    'results': results,
+                    'grouped_by_bioproject': grouped
                 }
-                
+            
+            return {
+                'success': True,
+                'query': query,
+                'result_type': result_type,
+                'count': len(results),
+                'results': results
+            }
+            
         except error.HTTPError as e:
             if e.code == 204:
                 return {
@@ -220,6 +457,97 @@ class ENASearcher:
                 'error': f'Unexpected error: {str(e)}'
             }
     
+    def _fetch_rows(self, url: str) -> List[Dict]:
+        """Fetch and decode one search URL, going through the response cache."""
+        rows = self._cache_get(url)
+        if rows is None:
+            # Decode rows while the rest of the response downloads
+            rows = list(_iter_json_array(self._http.stream(url, timeout=30)))
+            self._cache_put(url, rows)
+        return rows
+    
+    def _fetch_pages(self, search_url: str, url_suffix: str, limit: int, offset: int) -> List[Dict]:
+        """
+        Fetch a large result set as concurrent page requests.
+        
+        The limit is split into at most PAGE_WORKERS pages of at least
+        PAGE_SIZE rows, all requested at once, so a large search costs one
+        round trip and a handful of cache entries. Rows stop at the first
+        short page.
+        
+        Args:
+            search_url: Search URL without limit, offset, format and fields
+            url_suffix: The format and fields part of the URL
+            limit: Maximum number of rows to return
+            offset: Number of rows to skip
+            
+        Returns:
+            The rows of all pages, in order
+            
+        Raises:
+            urllib.error.HTTPError (204 if the first page is empty),
+            urllib.error.URLError or ValueError if a page fails
+        """
+        end = offset + limit
+        page_size = max(self.PAGE_SIZE, math.ceil(limit / self.PAGE_WORKERS))
+        pages = [(start, min(page_size, end - start))
+                 for start in range(offset, end, page_size)]
+        
+        def fetch(page):
+            start, page_limit = page
+            try:
+                return self._fetch_rows(f"{search_url}&limit={page_limit}&offset={start}{url_suffix}")
+            except error.HTTPError as e:
+                # Past the last result ENA answers 204; only an empty first
+                # page means the search found nothing
+                if e.code == 204 and start != offset:
+                    return []
+                raise
+        
+        rows = []
+        with ThreadPoolExecutor(max_workers=len(pages)) as executor:
+            # map preserves page order and re-raises the first failure
+            for (_, page_limit), page_rows in zip(pages, executor.map(fetch, pages)):
+                rows.extend(page_rows)
+                if len(page_rows) < page_limit:
+                    break
+        return rows
+    
+    def search_many(
+        self,
+        queries: List[str],
+        result_type: str = 'read_run',
+        limit: int = 10,
+        offset: int = 0,
+        fields: Optional[List[str]] = None,
+        group_by_bioproject: bool = True
+    ) -> List[Dict]:
+        """
+        Run several searches concurrently over the shared connection pool.
+        
+        Args:
+            queries: Search queries (organism names, accessions, etc.)
+            result_type: Type of results to return (read_run, assembly, etc.)
+            limit: Maximum number of results to return per query
+            offset: Number of results to skip per query (for pagination)
+            fields: Specific fields to return (None = default fields)
+            group_by_bioproject: Group read_run results by bioproject
+            
+        Returns:
+            List of search result dictionaries, in query order
+        """
+        def search(query):
+            return self.search(query, result_type, limit, offset, fields,
+                               group_by_bioproject=group_by_bioproject)
+        
+        if len(queries) == 1:
+            return [search(queries[0])]
+        
+        # Searches are independent and I/O bound; run them concurrently
+        # (map preserves input order)
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            return list(executor.map(search, queries))
+    
     def get_fastq_urls(self, run_accession: str) -> Dict:
         """
         Get direct FASTQ download URLs for a specific run accession.
@@ -230,39 +558,122 @@ class ENASearcher:
         Returns:
             Dictionary with FASTQ URLs and metadata
         """
-        fields = ['run_accession', 'fastq_ftp', 'fastq_md5', 'fastq_bytes']
+        run_data = self._get_single_run(run_accession)
+        if run_data is None:
+            return {'success': False, 'error': f'Run accession {run_accession} not found'}
+        return self._fastq_urls(run_data)
+    
+    def _get_single_run(self, run_accession: str) -> Optional[Dict]:
+        """
+        Fetch the FASTQ fields of one run.
         
-        result = self.search(
-            query=f'run_accession={run_accession}',
-            result_type='read_run',
-            limit=1,
-            fields=fields
-        )
+        The URL comes from a fixed template rather than going through
+        search(), as only the accession varies.
         
-        if not result['success'] or not result['results']:
-            return {'success': False, 'error': f'Run accession {run_accession} not found'}
+        Args:
+            run_accession: ENA run accession
+            
+        Returns:
+            The run's ENA record, or None if not found or the lookup failed
+        """
+        url = self.BASE_URL + self._SINGLE_RUN_PATH.format(accession=parse.quote_plus(run_accession))
+        try:
+            rows = self._fetch_rows(url)
+        except Exception:
+            return None
+        return rows[0] if rows else None
+    
+    def get_fastq_urls_batch(self, run_accessions: List[str]) -> Dict[str, Dict]:
+        """
+        Get direct FASTQ download URLs for several run accessions.
         
-        run_data = result['results'][0]
+        Runs are looked up with one ENA query per BATCH_SIZE accessions
+        rather than one query per run, and the queries run concurrently.
         
-        # Parse FASTQ FTP paths into downloadable URLs
+        Args:
+            run_accessions: ENA run accessions (e.g., ERR123456, SRR123456)
+            
+        Returns:
+            Dictionary mapping each run accession to its FASTQ URLs and
+            metadata, in the same shape as get_fastq_urls
+        """
+        queries = [
+            ' OR '.join(f'run_accession="{accession}"'
+                        for accession in run_accessions[i:i + self.BATCH_SIZE])
+            for i in range(0, len(run_accessions), self.BATCH_SIZE)
+        ]
+        
+        runs = {}
+        for result in self.search_many(queries, 'read_run', limit=self.BATCH_SIZE,
+                                       fields=self.FASTQ_FIELDS, group_by_bioproject=False):
+            if result['success']:
+                for run_data in result['results']:
+                    runs[run_data.get('run_accession', '').upper()] = run_data
+        
+        urls = {}
+        for run_accession in run_accessions:
+            run_data = runs.get(run_accession.upper())
+            if run_data is None:
+                urls[run_accession] = {'success': False, 'error': f'Run accession {run_accession} not found'}
+            else:
+                urls[run_accession] = self._fastq_urls(run_data)
+        return urls
+    
+    def _fastq_urls(self, run_data: Dict) -> Dict:
+        """Build the download URL result for one run's ENA record."""
         fastq_ftp = run_data.get('fastq_ftp', '')
-        fastq_urls = []
+        sizes = run_data.get('fastq_bytes', '').split(';')
+        md5s = run_data.get('fastq_md5', '').split(';')
         
+        # One entry per file, keeping each URL with its size and checksum;
+        # ENA gives bare host/path locations, never full URLs
+        files = []
         if fastq_ftp:
-            ftp_paths = fastq_ftp.split(';')
-            fastq_urls = [f'https://{path}' if not path.startswith('http') else path 
-                         for path in ftp_paths]
+            for path, size, md5 in zip_longest(fastq_ftp.split(';'), sizes, md5s, fillvalue=''):
+                if path:
+                    files.append({
+                        'url': 'https://' + path,
+                        'size': int(size) if size.isdigit() else None,
+                        'md5': md5 or None
+                    })
         
         return {
             'success': True,
             'run_accession': run_data.get('run_accession'),
-            'fastq_urls': fastq_urls,
-            'file_sizes': run_data.get('fastq_bytes', '').split(';'),
-            'md5_checksums': run_data.get('fastq_md5', '').split(';')
+            'fastq_urls': [file['url'] for file in files],
+            'file_sizes': sizes,
+            'md5_checksums': md5s,
+            'files': files
         }
 
 
-def format_output(data: Dict, format_type: str = 'human', show_urls: bool = False) -> str:
+def _dump_json(data: Dict, compact: bool) -> str:
+    """Serialize data as indented JSON, or compact JSON when compact is set."""
+    if compact:
+        return json.dumps(data, separators=(',', ':'))
+    return json.dumps(data, indent=2)
+
+
+# Display names for ENA field names ("fastq_ftp" -> "Fastq Ftp"), seeded
+# with the fields we request and extended as other fields are shown. Keys
+# are interned, like the row keys _iter_json_array produces, so lookups
+# match on identity
+_DISPLAY_NAMES = {
+    sys.intern(field): field.replace('_', ' ').title()
+    for fields in [
+        *ENASearcher.DEFAULT_FIELDS.values(),
+        ENASearcher.FALLBACK_FIELDS,
+        ['fastq_md5', 'submitted_ftp', 'sra_ftp', 'bam_ftp', 'generated_ftp']
+    ]
+    for field in fields
+}
+
+# Fields holding FTP paths, shown as download URLs with --show-urls
+_FTP_FIELDS = {field for field in _DISPLAY_NAMES if 'ftp' in field.lower()}
+
+
+def format_output(data: Dict, format_type: str = 'human', show_urls: bool = False,
+                  compact: bool = False, out: Optional[TextIO] = None) -> Optional[str]:
     """
     Format the search results for output.
     
@@ -270,91 +681,106 @@ def format_output(data: Dict, format_type: str = 'human', show_urls: bool = Fals
         data: Search results dictionary
         format_type: 'json' or 'human'
         show_urls: Show download URLs (for FASTQ results)
+        compact: Emit JSON without indentation (for piping to other programs)
+        out: Stream to write the output to, newline-terminated (optional)
         
     Returns:
-        Formatted string
+        Formatted string, or None when written to out
     """
+    buf = io.StringIO() if out is None else out
+    _write_output(buf.write, data, format_type, show_urls, compact)
+    if out is None:
+        # Drop the final newline, as print() adds its own
+        return buf.getvalue()[:-1]
+    return None
+
+
+def _write_output(write: Callable[[str], object], data: Dict, format_type: str,
+                  show_urls: bool, compact: bool):
+    """Write formatted results line by line through write."""
     if format_type == 'json':
-        return json.dumps(data, indent=2)
+        write(_dump_json(data, compact))
+        write('\n')
+        return
     
     if not data.get('success'):
         error_msg = data.get('error', 'Unknown error')
         suggestion = data.get('suggestion', '')
-        return f"Error: {error_msg}\n{suggestion}"
+        write(f"Error: {error_msg}\n{suggestion}\n")
+        return
     
     # Human-readable format
-    output = []
-    output.append(f"Query: {data.get('query', 'N/A')}")
-    output.append(f"Result Type: {data.get('result_type', 'N/A')}")
-    output.append(f"Results Found: {data.get('count', 0)}")
+    write(f"Query: {data.get('query', 'N/A')}\n")
+    write(f"Result Type: {data.get('result_type', 'N/A')}\n")
+    write(f"Results Found: {data.get('count', 0)}\n")
     
     # Show bioproject grouping summary if available
     if data.get('grouped_by_bioproject'):
-        output.append(f"Total BioProjects: {data.get('total_bioprojects', 0)}")
+        write(f"Total BioProjects: {data.get('total_bioprojects', 0)}\n")
     
     if data.get('message'):
-        output.append(f"\n{data['message']}")
+        write(f"\n{data['message']}\n")
     
     # Display grouped by bioproject if available
     if data.get('grouped_by_bioproject'):
-        output.append("\n" + "="*60)
-        output.append("RESULTS GROUPED BY BIOPROJECT")
-        output.append("="*60)
+        write("\n" + "="*60 + "\n")
+        write("RESULTS GROUPED BY BIOPROJECT\n")
+        write("="*60 + "\n")
         
         for i, bioproject in enumerate(data['grouped_by_bioproject'], 1):
-            output.append(f"\nBioProject {i}:")
-            output.append(f"  Accession: {bioproject['bioproject_accession']}")
-            output.append(f"  Number of Reads: {bioproject['read_count']}")
+            write(f"\nBioProject {i}:\n")
+            write(f"  Accession: {bioproject['bioproject_accession']}\n")
+            write(f"  Number of Reads: {bioproject['read_count']}\n")
             if bioproject.get('study_title'):
-                output.append(f"  Title: {bioproject['study_title']}")
+                write(f"  Title: {bioproject['study_title']}\n")
             
             # Show first few runs as examples
-            output.append("  Sample Runs:")
+            write("  Sample Runs:\n")
             for j, run in enumerate(bioproject['runs'][:3], 1):
-                output.append(f"    {j}. {run.get('run_accession', 'N/A')} - {run.get('library_layout', 'N/A')}")
+                write(f"    {j}. {run.get('run_accession', 'N/A')} - {run.get('library_layout', 'N/A')}\n")
             
             if len(bioproject['runs']) > 3:
-                output.append(f"    ... and {len(bioproject['runs']) - 3} more")
+                write(f"    ... and {len(bioproject['runs']) - 3} more\n")
             
-            output.append("-"*60)
+            write("-"*60 + "\n")
         
-        return '\n'.join(output)
+        return
     
     if data.get('results'):
-        output.append("\n" + "="*60)
+        write("\n" + "="*60 + "\n")
         
         for i, result in enumerate(data['results'], 1):
-            output.append(f"\nResult {i}:")
+            write(f"\nResult {i}:\n")
             
             # Format each field nicely
             for key, value in result.items():
                 if value:  # Only show non-empty fields
                     # Clean up the field name for display
-                    display_key = key.replace('_', ' ').title()
+                    display_key = _DISPLAY_NAMES.get(key)
+                    if display_key is None:
+                        display_key = _DISPLAY_NAMES[key] = key.replace('_', ' ').title()
+                        if 'ftp' in key.lower():
+                            _FTP_FIELDS.add(key)
                     
                     # Handle FTP paths specially
-                    if 'ftp' in key.lower() and show_urls:
-                        if ';' in str(value):
-                            urls = value.split(';')
-                            output.append(f"  {display_key}:")
-                            for url in urls:
-                                if not url.startswith('http'):
-                                    url = f'https://{url}'
-                                output.append(f"    - {url}")
+                    if show_urls and key in _FTP_FIELDS:
+                        # All paths of a field share one form, so check once
+                        prefix = '' if value.startswith('http') else 'https://'
+                        if ';' in value:
+                            write(f"  {display_key}:\n")
+                            item = f"    - {prefix}"
+                            write(item + value.replace(';', '\n' + item) + '\n')
                         else:
-                            if not value.startswith('http'):
-                                value = f'https://{value}'
-                            output.append(f"  {display_key}: {value}")
+                            write(f"  {display_key}: {prefix}{value}\n")
                     else:
-                        # Truncate long values
-                        str_value = str(value)
+                        # Truncate long values (ENA values are nearly always
+                        # strings already, so skip the str() call for them)
+                        str_value = value if type(value) is str else str(value)
                         if len(str_value) > 100:
                             str_value = str_value[:97] + '...'
-                        output.append(f"  {display_key}: {str_value}")
+                        write(f"  {display_key}: {str_value}\n")
             
-            output.append("-"*60)
-    
-    return '\n'.join(output)
+            write("-"*60 + "\n")
 
 
 def main():
@@ -376,6 +802,7 @@ Examples:
   python search_ena.py "Mus musculus" --data-type fastq --limit 20
   python search_ena.py "Escherichia coli" --format json
   python search_ena.py "Homo sapiens" --show-urls
+  python search_ena.py "Homo sapiens" --limit 500 --top-bioprojects 5
   python search_ena.py "study_accession=PRJEB1234" --data-type read
         """
     )
@@ -391,24 +818,28 @@ Examples:
                        help='Number of results to skip (default: 0)')
     parser.add_argument('--format', choices=['human', 'json'], default='human',
                        help='Output format (default: human)')
+    parser.add_argument('--top-bioprojects', type=int, metavar='N',
+                       help='Only list the N BioProjects with the most runs (read data only)')
     parser.add_argument('--show-urls', action='store_true',
                        help='Show full download URLs for FASTQ files')
     
     args = parser.parse_args()
-    
-    searcher = ENASearcher()
+    if args.top_bioprojects is not None and args.top_bioprojects < 1:
+        parser.error('--top-bioprojects must be at least 1')
     
     # Map the data type argument to ENA result type
-    result_type = searcher.RESULT_TYPES.get(args.data_type, 'read_run')
+    result_type = ENASearcher.RESULT_TYPES.get(args.data_type, 'read_run')
     
-    result = searcher.search(
-        query=args.query,
-        result_type=result_type,
-        limit=args.limit,
-        offset=args.offset
-    )
+    with ENASearcher() as searcher:
+        result = searcher.search(
+            query=args.query,
+            result_type=result_type,
+            limit=args.limit,
+            offset=args.offset,
+            top_k=args.top_bioprojects
+        )
     
-    print(format_output(result, args.format, args.show_urls))
+    format_output(result, args.format, args.show_urls, compact=not sys.stdout.isatty(), out=sys.stdout)
     sys.exit(0 if result.get('success') else 1)
 
 